@@ -1,15 +1,98 @@
+import array
+import codecs
+import struct
+import sys
 from abc import ABC, abstractmethod
-from collections.abc import Callable
+from collections.abc import Callable, Sized
+from functools import lru_cache
 
 # TODO: This should probably default to utf-8 but is set to cp437 to test with StarCraft 2 data
 STRING_CODEC = "cp437"
 
 
-DeserializePredicate = Callable[["Serializer", str, "BaseField", dict, bytes, int], bool]
-SerializePredicate = Callable[["Serializer", str, "BaseField", dict, bytes], bool]
+# Note: Deserialize predicates get the whole input buffer and the field's absolute offset in it, including for fields
+# inside a NestedSerializer (so data[offset] is always the field's first byte)
+DeserializePredicate = Callable[["type[Serializer]", str, "BaseField", dict, bytes, int], bool]
+SerializePredicate = Callable[["type[Serializer]", str, "BaseField", dict, bytes], bool]
+
+# Formats are parsed once here rather than on every (de)serialize call
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+# Bind the codec once instead of going through the codec registry on every call
+_STRING_CODEC_INFO = codecs.lookup(STRING_CODEC)
+_ASCII = bytes(range(128))
+_ASCII_COMPATIBLE = _ASCII.decode(STRING_CODEC, "replace") == _ASCII.decode("ascii")
+
+
+def _decode_string(mbs: bytes) -> str:
+    if _ASCII_COMPATIBLE and mbs.isascii():
+        return mbs.decode("ascii")
+    return _STRING_CODEC_INFO.decode(mbs)[0]
+
+
+def _encode_string(obj: str) -> bytes:
+    if _ASCII_COMPATIBLE and obj.isascii():
+        return obj.encode("ascii")
+    return _STRING_CODEC_INFO.encode(obj)[0]
+
+
+# Lists at least this long are decoded through array.array, skipping the intermediate tuple
+_ARRAY_THRESHOLD = 256
+# Note: array typecode sizes are platform dependent so map them by item size
+_UNSIGNED_TYPECODES = "QLIHB"
+_ARRAY_TYPECODES = {array.array(typecode).itemsize: typecode for typecode in _UNSIGNED_TYPECODES}
+
+
+@lru_cache
+def _uint_array_struct(element_struct: struct.Struct, count: int) -> struct.Struct:
+    return struct.Struct(f"<{count}{element_struct.format[-1]}")
+
+
+def _check_available(data: bytes, offset: int, size: int, what: str):
+    # Note: Bulk paths raise the same error struct would if the items were unpacked one at a time
+    if len(data) - offset < size:
+        raise struct.error(f"Expected {size} bytes of {what}")
+
+
+def _unpack_uint_array(element_length: int, count: int, data: bytes, offset: int) -> array.array:
+    size = element_length * count
+    _check_available(data, offset, size, "array data")
+    elements = array.array(_ARRAY_TYPECODES[element_length])
+    elements.frombytes(memoryview(data)[offset : offset + size])
+    if sys.byteorder == "big":
+        elements.byteswap()
+    return elements
+
+
+# Methods that struct based fast paths stand in for
+_FIXED_LAYOUT_METHODS = ("deserialize", "serialize", "serialize_into", "decode_fixed", "encode_fixed")
+
+
+def _fit_length(mbs: bytes, length: int) -> bytes:
+    # Note: Pads and truncates the same way as the struct "s" format used by fixed-size runs
+    if type(mbs) is not bytes:
+        # Only hand back the caller's object when it is immutable, bytearray and memoryview inputs are copied
+        mbs = bytes(mbs)
+    mbs_length = len(mbs)
+    if mbs_length == length:
+        return mbs
+    if mbs_length > length:
+        return mbs[:length]
+    return mbs.ljust(length, b"\0")
 
 
 class BaseField(ABC):
+    # Note: ABC defines empty __slots__ so fields carry no per-instance __dict__
+    __slots__ = ("validator", "deserialize_predicate", "serialize_predicate")
+
+    fixed_format = None  # struct format code for fields whose size is known up front
+    # Optional conversions between struct values and field values for fixed-size fields
+    decode_fixed = None
+    encode_fixed = None
+
     def __init__(
         self,
         validator=None,
@@ -23,140 +106,285 @@ class BaseField(ABC):
     def validate(self, value):
         return self.validator(value) if self.validator else None
 
+    def has_fixed_layout(self) -> bool:
+        # Fast paths handle these fields through fixed_format without calling their methods, so subclasses that
+        # override any of them are excluded unless they declare a fixed_format of their own
+        field_type = type(self)
+        owner = next(cls for cls in field_type.__mro__ if "fixed_format" in vars(cls))
+        return self.fixed_format is not None and all(
+            getattr(field_type, name) is getattr(owner, name) for name in _FIXED_LAYOUT_METHODS
+        )
+
     @abstractmethod
-    def deserialize(self, data: bytes):
+    def deserialize(self, data: bytes, offset: int = 0):
         raise NotImplementedError
 
     @abstractmethod
     def serialize(self, obj) -> bytes:
         raise NotImplementedError
 
+    def serialize_into(self, buf: bytearray, pos: int, obj) -> int:
+        # Overwrites buf from pos (growing it if needed) and returns the position after the written data
+        if pos > len(buf):
+            raise ValueError(f"Position {pos} is past the end of the {len(buf)} byte buffer")
+        data = self.serialize(obj)
+        end = pos + len(data)
+        buf[pos:end] = data
+        return end
+
 
 class ByteArray(BaseField):
+    __slots__ = ("length",)
+
     def __init__(self, length: int, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.length = length
 
-    def deserialize(self, data: bytes) -> (bytes, int):
-        return data[: self.length], self.length
+    @property
+    def fixed_format(self):
+        return f"{self.length}s"
+
+    def deserialize(self, data: bytes, offset: int = 0) -> (bytes, int):
+        return data[offset : offset + self.length], self.length
 
     def serialize(self, obj: bytes) -> bytes:
-        # TODO: Throw an error here if we don't have enough data (also in FixedString)
-        return obj[: self.length]
+        return _fit_length(obj, self.length)
 
 
 class UInt8(BaseField):
-    length = 1
+    __slots__ = ()
+    _s = _U8
+    length = _s.size
+    fixed_format = "B"
 
-    def deserialize(self, data: bytes) -> (int, int):
-        return int.from_bytes(data[: self.length], byteorder="little", signed=False), self.length
+    def deserialize(self, data: bytes, offset: int = 0) -> (int, int):
+        return self._s.unpack_from(data, offset)[0], self._s.size
 
     def serialize(self, obj) -> bytes:
-        return obj.to_bytes(length=self.length, byteorder="little", signed=False)
+        return self._s.pack(obj)
+
+    def get_serialize(self) -> Callable:
+        # Stock UInt fields hand out Struct.pack itself, saving a Python frame per value
+        if type(self).serialize is UInt8.serialize:
+            return self._s.pack
+        return self.serialize
+
+    def serialize_into(self, buf: bytearray, pos: int, obj) -> int:
+        end = pos + self._s.size
+        if len(buf) < end or type(self).serialize is not UInt8.serialize:
+            return super().serialize_into(buf, pos, obj)
+        self._s.pack_into(buf, pos, obj)
+        return end
 
 
 class UInt16(UInt8):
-    length = 2
+    __slots__ = ()
+    _s = _U16
+    length = _s.size
+    fixed_format = "H"
 
 
 class UInt32(UInt8):
-    length = 4
+    __slots__ = ()
+    _s = _U32
+    length = _s.size
+    fixed_format = "I"
 
 
 class UInt64(UInt8):
-    length = 8
+    __slots__ = ()
+    _s = _U64
+    length = _s.size
+    fixed_format = "Q"
+
+
+def _is_stock_uint(field: BaseField) -> bool:
+    # Fast paths work on a UInt field's struct directly, so subclasses overriding its methods take the regular path
+    return isinstance(field, UInt8) and field.has_fixed_layout()
 
 
 class ZString(BaseField):
-    def deserialize(self, data: bytes) -> (str, int):
-        mbs, _ = data.split(b"\0", 1)
-        return mbs.decode(STRING_CODEC), len(mbs) + 1
+    __slots__ = ()
+
+    def deserialize(self, data: bytes, offset: int = 0) -> (str, int):
+        end = data.index(0, offset)
+        return _decode_string(data[offset:end]), end - offset + 1
 
     def serialize(self, obj) -> bytes:
-        return obj.encode(STRING_CODEC) + b"\0"
+        return _encode_string(obj) + b"\0"
 
 
 class DynamicString(BaseField):
-    length = 0  # Length isn't known until other fields are deserialized
+    __slots__ = ("length",)
 
-    def deserialize(self, data: bytes) -> (str, int):
-        mbs = data[: self.length]
-        return mbs.decode(STRING_CODEC), len(mbs)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.length = 0  # Length isn't known until other fields are deserialized
+
+    def deserialize(self, data: bytes, offset: int = 0) -> (str, int):
+        mbs = data[offset : offset + self.length]
+        return _decode_string(mbs), len(mbs)
 
     def serialize(self, obj) -> bytes:
-        return obj.encode(STRING_CODEC)
+        return _encode_string(obj)
 
 
 class FixedString(DynamicString):
+    __slots__ = ()
+
     def __init__(self, length: int, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.length = length
 
+    @property
+    def fixed_format(self):
+        return f"{self.length}s"
+
+    def serialize(self, obj) -> bytes:
+        return _fit_length(_encode_string(obj), self.length)
+
+    def decode_fixed(self, mbs: bytes) -> str:
+        return _decode_string(mbs)
+
+    def encode_fixed(self, obj: str) -> bytes:
+        return _encode_string(obj)
+
 
 class ReverseFixedString(FixedString):
-    def deserialize(self, data: bytes) -> (str, int):
-        value, length = super().deserialize(data)
-        value = value[::-1]
-        return value, length
+    __slots__ = ()
+    fixed_format = FixedString.fixed_format  # Reversal is handled by decode_fixed/encode_fixed
+
+    # Note: Reversing the raw bytes only matches reversing the text for single-byte codecs
+    def deserialize(self, data: bytes, offset: int = 0) -> (str, int):
+        mbs = data[offset : offset + self.length]
+        return _decode_string(mbs[::-1]), len(mbs)
 
     def serialize(self, obj) -> bytes:
-        return super().serialize(obj[::-1])
+        return _fit_length(_encode_string(obj)[::-1], self.length)
+
+    def decode_fixed(self, mbs: bytes) -> str:
+        return _decode_string(mbs[::-1])
+
+    def encode_fixed(self, obj: str) -> bytes:
+        return _encode_string(obj)[::-1]
 
 
 class DynamicList(BaseField):
-    length = 0  # Length isn't known until other fields are deserialized
+    __slots__ = ("length", "element_field", "as_array", "_element_struct", "_element_bytes_length")
 
-    def __init__(self, element_field: BaseField, *args, **kwargs):
+    def __init__(self, element_field: BaseField, *args, as_array: bool = False, **kwargs):
         super().__init__(*args, **kwargs)
+        self.length = 0  # Length isn't known until other fields are deserialized
+        if as_array and not _is_stock_uint(element_field):
+            raise ValueError("as_array requires a UInt element field without overridden methods")
         self.element_field = element_field
-
-    def deserialize(self, data: bytes) -> (list, int):
-        offset = 0
+        self.as_array = as_array  # Use a compact array.array instead of a list of ints
+        # Stock UInt and ByteArray elements are handled in bulk, decided once here rather than on every call
+        self._element_struct = element_field._s if _is_stock_uint(element_field) else None
+        stock_byte_array = isinstance(element_field, ByteArray) and element_field.has_fixed_layout()
+        self._element_bytes_length = element_field.length if stock_byte_array else None
+
+    def deserialize(self, data: bytes, offset: int = 0) -> (list, int):
+        element_struct = self._element_struct
+        if element_struct is not None:
+            if self.as_array:
+                elements = _unpack_uint_array(element_struct.size, self.length, data, offset)
+                return elements, element_struct.size * self.length
+            if self.length >= _ARRAY_THRESHOLD:
+                elements = _unpack_uint_array(element_struct.size, self.length, data, offset)
+                return elements.tolist(), element_struct.size * self.length
+            # Unpack the whole array in a single call
+            array_struct = _uint_array_struct(element_struct, self.length)
+            return list(array_struct.unpack_from(data, offset)), array_struct.size
+        n = self._element_bytes_length
+        if n is not None:
+            return [data[offset + i * n : offset + (i + 1) * n] for i in range(self.length)], n * self.length
+
+        element_field = self.element_field
+        start = offset
         elements = []
 
         for _ in range(self.length):
-            element, element_length = self.element_field.deserialize(data[offset:])
+            element, element_length = element_field.deserialize(data, offset)
             elements.append(element)
             offset += element_length
 
-        return elements, offset
+        return elements, offset - start
 
     def serialize(self, obj) -> bytes:
-        data = b""
-        for element in obj:
-            data += self.element_field.serialize(element)
-        return data
+        element_struct = self._element_struct
+        if element_struct is not None:
+            # Note: Signed and float arrays go through struct so they are range checked like lists
+            if (
+                isinstance(obj, array.array)
+                and obj.typecode in _UNSIGNED_TYPECODES
+                and obj.itemsize == element_struct.size
+            ):
+                if sys.byteorder == "big":
+                    obj = array.array(obj.typecode, obj)
+                    obj.byteswap()
+                return obj.tobytes()
+            if not isinstance(obj, Sized):
+                obj = list(obj)
+            # Pack the whole array in a single call
+            return _uint_array_struct(element_struct, len(obj)).pack(*obj)
+        serialize = self.element_field.serialize
+        return b"".join([serialize(element) for element in obj])
 
 
 class EncodedLength(BaseField):
+    __slots__ = ("length_field", "element_field", "_length_struct", "_is_string")
+
     def __init__(self, length_field: BaseField, element_field: BaseField, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.length_field = length_field
         self.element_field = element_field
-
-    def deserialize(self, data: bytes):
-        length, offset = self.length_field.deserialize(data)
+        # Length prefixed strings and bytes are handled here directly, without updating the element's length
+        fused = _is_stock_uint(length_field) and type(element_field) in (DynamicString, ByteArray)
+        self._length_struct = length_field._s if fused else None
+        self._is_string = type(element_field) is DynamicString
+
+    def deserialize(self, data: bytes, offset: int = 0):
+        length_struct = self._length_struct
+        if length_struct is not None:
+            (length,) = length_struct.unpack_from(data, offset)
+            start = offset + length_struct.size
+            mbs = data[start : start + length]
+            if self._is_string:
+                return _decode_string(mbs), length_struct.size + len(mbs)
+            return mbs, length_struct.size + length
+
+        length, length_length = self.length_field.deserialize(data, offset)
         self.element_field.length = length
-        element, element_length = self.element_field.deserialize(data[offset:])
-        return element, offset + element_length
+        element, element_length = self.element_field.deserialize(data, offset + length_length)
+        return element, length_length + element_length
 
     def serialize(self, obj) -> bytes:
-        data = self.length_field.serialize(len(obj))
-        data += self.element_field.serialize(obj)
-        return data
+        length_struct = self._length_struct
+        if length_struct is not None:
+            mbs = _encode_string(obj) if self._is_string else obj
+            return length_struct.pack(len(mbs)) + mbs
+
+        return b"".join((self.length_field.serialize(len(obj)), self.element_field.serialize(obj)))
 
 
 class NestedSerializer(BaseField):
-    def __init__(self, serializer: "Serializer", *args, **kwargs):
+    __slots__ = ("serializer",)
+
+    def __init__(self, serializer: "type[Serializer] | Serializer", *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.serializer = serializer
+        # Serializer methods are classmethods, so keep the class even when given an instance
+        self.serializer = serializer if isinstance(serializer, type) else type(serializer)
 
-    def deserialize(self, data: bytes) -> (dict, int):
-        return self.serializer.deserialize(data)
+    def deserialize(self, data: bytes, offset: int = 0) -> (dict, int):
+        return self.serializer.deserialize(data, offset)
 
     def serialize(self, obj) -> bytes:
         return self.serializer.serialize(obj)
 
+    def serialize_into(self, buf: bytearray, pos: int, obj) -> int:
+        return self.serializer.serialize_into(buf, obj, pos)
+
 
 class ValidationError(Exception):
     pass
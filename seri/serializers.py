@@ -1,4 +1,80 @@
-from seri.fields import BaseField
+import struct
+from itertools import groupby
+from operator import itemgetter
+
+from seri.fields import BaseField, UInt8, _check_available
+
+
+def _get_validate(field: BaseField):
+    # Skip the call for fields that would do nothing, but keep subclasses that override validate itself
+    if field.validator or type(field).validate is not BaseField.validate:
+        return field.validate
+    return None
+
+
+class _FieldRun:
+    """Consecutive fixed-size fields that are (de)serialized with a single struct call"""
+
+    def __init__(self, fields: dict):
+        self.names = tuple(fields)
+        self.struct = struct.Struct("<" + "".join(field.fixed_format for field in fields.values()))
+        validators = ((key, _get_validate(field)) for key, field in fields.items())
+        self.validators = tuple((key, validate) for key, validate in validators if validate is not None)
+        self.decoders = tuple((key, field.decode_fixed) for key, field in fields.items() if field.decode_fixed)
+        self.encoders = tuple(
+            (index, field.encode_fixed) for index, field in enumerate(fields.values()) if field.encode_fixed
+        )
+        self._get_values = itemgetter(*self.names)
+
+    def deserialize(self, data: bytes, offset: int = 0) -> (dict, int):
+        values = dict(zip(self.names, self.struct.unpack_from(data, offset)))
+        for key, decode in self.decoders:
+            values[key] = decode(values[key])
+        for key, validate in self.validators:
+            validate(values[key])
+        return values, self.struct.size
+
+    def serialize(self, attrs: dict) -> bytes:
+        values = self._get_values(attrs)
+        if self.encoders:
+            values = list(values)
+            for index, encode in self.encoders:
+                values[index] = encode(values[index])
+        return self.struct.pack(*values)
+
+    def deserialize_many(self, data: bytes, count: int, offset: int = 0) -> (list, int):
+        if self.struct.size == 0:
+            # iter_unpack rejects empty structs (e.g. runs of zero-length byte arrays), every record is the same
+            return [self.deserialize(data, offset)[0] for _ in range(count)], 0
+        size = self.struct.size * count
+        _check_available(data, offset, size, "record data")
+        names = self.names
+        view = memoryview(data)[offset : offset + size]
+        records = [dict(zip(names, values)) for values in self.struct.iter_unpack(view)]
+        if self.decoders or self.validators:
+            for values in records:
+                for key, decode in self.decoders:
+                    values[key] = decode(values[key])
+                for key, validate in self.validators:
+                    validate(values[key])
+        return records, size
+
+    def serialize_many(self, records: list) -> bytes:
+        if self.encoders:
+            return b"".join([self.serialize(attrs) for attrs in records])
+        pack = self.struct.pack
+        get_values = self._get_values
+        return b"".join([pack(*get_values(attrs)) for attrs in records])
+
+    def serialize_into(self, buf: bytearray, pos: int, attrs: dict) -> int:
+        if pos > len(buf):
+            raise ValueError(f"Position {pos} is past the end of the {len(buf)} byte buffer")
+        end = pos + self.struct.size
+        if self.encoders or len(buf) < end:
+            buf[pos:end] = self.serialize(attrs)
+        else:
+            self.struct.pack_into(buf, pos, *self._get_values(attrs))
+        return end
 
 
 class SerializerMeta(type):
@@ -8,29 +84,126 @@ class SerializerMeta(type):
         fields = {key: value for key, value in attrs.items() if isinstance(value, BaseField)}
         return fields
 
+    @staticmethod
+    def _group_runs(fields: dict, predicate_name: str):
+        """Yield runs of consecutive fixed-size fields (which share one struct call) and groups of other fields"""
+
+        def is_fixed(item) -> bool:
+            field = item[1]
+            return field.has_fixed_layout() and getattr(field, predicate_name) is None
+
+        for fixed, group in groupby(fields.items(), key=is_fixed):
+            group = dict(group)
+            if fixed and len(group) > 1:
+                yield _FieldRun(group), {}
+            else:
+                yield None, group
+
+    @classmethod
+    def _get_deserialize_plan(cls, fields: dict) -> tuple:
+        # Note: Run steps have no key, their values come back as a dict
+        plan = []
+        for run, group in cls._group_runs(fields, "deserialize_predicate"):
+            if run is not None:
+                plan.append((None, run, run.deserialize, None, None))
+            for key, field in group.items():
+                plan.append((key, field, field.deserialize, _get_validate(field), field.deserialize_predicate))
+        return tuple(plan)
+
+    @classmethod
+    def _get_serialize_plan(cls, fields: dict) -> tuple:
+        # Note: Run steps have no key, they read their values from attrs directly
+        plan = []
+        for run, group in cls._group_runs(fields, "serialize_predicate"):
+            if run is not None:
+                plan.append((None, run, run.serialize, run.serialize_into, None))
+            for key, field in group.items():
+                serialize = field.get_serialize() if isinstance(field, UInt8) else field.serialize
+                plan.append((key, field, serialize, field.serialize_into, field.serialize_predicate))
+        return tuple(plan)
+
+    @staticmethod
+    def _get_fixed_run(fields: dict) -> _FieldRun | None:
+        # Serializers made up entirely of fixed-size fields are handled by a single run
+        if len(fields) < 2:
+            return None
+        for field in fields.values():
+            if not field.has_fixed_layout() or field.deserialize_predicate or field.serialize_predicate:
+                return None
+        return _FieldRun(fields)
+
     def __new__(cls, name, bases, attrs, **kwds):
-        attrs["fields"] = cls._get_fields(attrs)
+        fields = cls._get_fields(attrs)
+        attrs["fields"] = fields
+        # Fields are fixed once the class exists, so bind their methods up front
+        attrs["_deserialize_plan"] = cls._get_deserialize_plan(fields)
+        attrs["_serialize_plan"] = cls._get_serialize_plan(fields)
+        attrs["_fixed_run"] = cls._get_fixed_run(fields)
         return super().__new__(cls, name, bases, attrs)
 
 
 class Serializer(metaclass=SerializerMeta):
     fields = {}
 
-    def deserialize(self, data: bytes) -> (dict, int):
+    @classmethod
+    def deserialize(cls, data: bytes, offset: int = 0) -> (dict, int):
+        if cls._fixed_run is not None:
+            return cls._fixed_run.deserialize(data, offset)
+
         attrs = {}
-        offset = 0
-        for name, field in self.fields.items():
-            if field.deserialize_predicate is None or field.deserialize_predicate(
-                self, name, field, attrs, data, offset
-            ):
-                attrs[name], field_length = field.deserialize(data[offset:])
-                field.validate(attrs[name])
+        start = offset
+        for name, field, deserialize, validate, predicate in cls._deserialize_plan:
+            if predicate is None or predicate(cls, name, field, attrs, data, offset):
+                value, field_length = deserialize(data, offset)
                 offset += field_length
-        return attrs, offset
+                if name is None:
+                    attrs.update(value)
+                    continue
+                attrs[name] = value
+                if validate is not None:
+                    validate(value)
+        return attrs, offset - start
 
-    def serialize(self, attrs: dict) -> bytes:
-        data = b""
-        for name, field in self.fields.items():
-            if field.serialize_predicate is None or field.serialize_predicate(self, name, field, attrs, data):
-                data += field.serialize(attrs[name])
-        return data
+    @classmethod
+    def serialize(cls, attrs: dict) -> bytes:
+        if cls._fixed_run is not None:
+            return cls._fixed_run.serialize(attrs)
+
+        parts = []
+        append = parts.append
+        for name, field, serialize, _, predicate in cls._serialize_plan:
+            # Only join the parts when a predicate actually needs to see the data so far
+            if predicate is None or predicate(cls, name, field, attrs, b"".join(parts)):
+                append(serialize(attrs if name is None else attrs[name]))
+        return b"".join(parts)
+
+    @classmethod
+    def serialize_into(cls, buf: bytearray, attrs: dict, pos: int = 0) -> int:
+        # Lets streaming callers reuse one buffer instead of allocating output for every record
+        if cls._fixed_run is not None:
+            return cls._fixed_run.serialize_into(buf, pos, attrs)
+
+        start = pos
+        for name, field, _, serialize_into, predicate in cls._serialize_plan:
+            if predicate is None or predicate(cls, name, field, attrs, bytes(buf[start:pos])):
+                pos = serialize_into(buf, pos, attrs if name is None else attrs[name])
+        return pos
+
+    @classmethod
+    def deserialize_many(cls, data: bytes, count: int, offset: int = 0) -> (list, int):
+        if cls._fixed_run is not None:
+            return cls._fixed_run.deserialize_many(data, count, offset)
+
+        records = []
+        start = offset
+        for _ in range(count):
+            attrs, length = cls.deserialize(data, offset)
+            records.append(attrs)
+            offset += length
+        return records, offset - start
+
+    @classmethod
+    def serialize_many(cls, records: list) -> bytes:
+        if cls._fixed_run is not None:
+            return cls._fixed_run.serialize_many(records)
+        return b"".join([cls.serialize(attrs) for attrs in records])
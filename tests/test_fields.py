@@ -1,9 +1,23 @@
+import array
+import copy
+import struct
 import unittest
 from seri import fields
 from seri.fields import ValidationError
 from seri.serializers import Serializer
 
 
+class DoubledUInt8(fields.UInt8):
+    """Stores values doubled, overriding the stock UInt8 methods"""
+
+    def deserialize(self, data: bytes, offset: int = 0) -> (int, int):
+        value, length = super().deserialize(data, offset)
+        return value // 2, length
+
+    def serialize(self, obj) -> bytes:
+        return super().serialize(obj * 2)
+
+
 class TestByteArray(unittest.TestCase):
     def test_deserialize(self):
         field = fields.ByteArray(length=4)
@@ -24,12 +38,19 @@ class TestByteArray(unittest.TestCase):
         data = field.serialize(obj)
         self.assertEqual(data, b"\x01\x02\x03\x04")
 
-    @unittest.expectedFailure
-    def test_serialize_too_short(self):
+    def test_serialize_too_short_pads_with_nulls(self):
         field = fields.ByteArray(length=4)
         obj = b"\x01\x02"
-        with self.assertRaises(ValueError):
-            field.serialize(obj)
+        data = field.serialize(obj)
+        self.assertEqual(data, b"\x01\x02\x00\x00")
+
+    def test_serialize_mutable_buffer(self):
+        field = fields.ByteArray(length=4)
+        for obj in (bytearray(b"\x01\x02\x03\x04"), memoryview(b"\x01\x02\x03\x04\x05"), bytearray(b"\x01")):
+            data = field.serialize(obj)
+            self.assertIs(type(data), bytes)
+            self.assertIsNot(data, obj)
+        self.assertEqual(data, b"\x01\x00\x00\x00")
 
 
 class TestUIntFields(unittest.TestCase):
@@ -73,6 +94,25 @@ class TestUIntFields(unittest.TestCase):
         data = field.serialize(18446744073709551615)
         self.assertEqual(data, b"\xff\xff\xff\xff\xff\xff\xff\xff")
 
+    def test_subclass_serialize_override(self):
+        class TestSerializer(Serializer):
+            a = DoubledUInt8()
+            b = fields.UInt8()
+
+        data = TestSerializer.serialize({"a": 2, "b": 1})
+        self.assertEqual(data, b"\x04\x01")
+        buf = bytearray(2)
+        self.assertEqual(TestSerializer.serialize_into(buf, {"a": 2, "b": 1}), 2)
+        self.assertEqual(buf, b"\x04\x01")
+
+    def test_deserialize_offset_buffers(self):
+        field = fields.UInt32()
+        raw = b"\xff\x01\x02\x03\x04"
+        for data in (raw, bytearray(raw), memoryview(raw)):
+            value, length = field.deserialize(data, 1)
+            self.assertEqual(value, 0x04030201)
+            self.assertEqual(length, 4)
+
 
 class TestZString(unittest.TestCase):
     def test_deserialize(self):
@@ -82,12 +122,31 @@ class TestZString(unittest.TestCase):
         self.assertEqual(value, "hello")
         self.assertEqual(length, 6)
 
+    def test_deserialize_offset(self):
+        field = fields.ZString()
+        data = b"hello\0world\0"
+        value, length = field.deserialize(data, 6)
+        self.assertEqual(value, "world")
+        self.assertEqual(length, 6)
+
+    def test_deserialize_unterminated(self):
+        field = fields.ZString()
+        with self.assertRaises(ValueError):
+            field.deserialize(b"hello\0world", 6)
+
     def test_serialize(self):
         field = fields.ZString()
         obj = "hello"
         data = field.serialize(obj)
         self.assertEqual(data, b"hello\0")
 
+    def test_non_ascii(self):
+        field = fields.ZString()
+        value, length = field.deserialize(b"\x81ber\0")
+        self.assertEqual(value, "\u00fcber")
+        self.assertEqual(length, 5)
+        self.assertEqual(field.serialize(value), b"\x81ber\0")
+
 
 class TestFixedString(unittest.TestCase):
     def test_deserialize(self):
@@ -103,6 +162,18 @@ class TestFixedString(unittest.TestCase):
         data = field.serialize(obj)
         self.assertEqual(data, b"hello")
 
+    def test_serialize_pads_and_truncates(self):
+        field = fields.FixedString(length=4)
+        self.assertEqual(field.serialize("ab"), b"ab\0\0")
+        self.assertEqual(field.serialize("abcdef"), b"abcd")
+
+    def test_serialize_next_to_dynamic_field(self):
+        class TestSerializer(Serializer):
+            name = fields.FixedString(length=4)
+            other = fields.ZString()
+
+        self.assertEqual(TestSerializer.serialize({"name": "ab", "other": "c"}), b"ab\0\0c\0")
+
 
 class TestDynamicList(unittest.TestCase):
     def test_deserialize(self):
@@ -119,6 +190,107 @@ class TestDynamicList(unittest.TestCase):
         data = field.serialize(obj)
         self.assertEqual(data, b"\x01\x02\x03")
 
+    def test_deserialize_uint16(self):
+        field = fields.DynamicList(element_field=fields.UInt16())
+        field.length = 2
+        data = b"\xff\x01\x00\xff\xff\x00"
+        value, length = field.deserialize(data, 1)
+        self.assertEqual(value, [1, 0xFFFF])
+        self.assertEqual(length, 4)
+
+    def test_deserialize_long_uint32(self):
+        field = fields.DynamicList(element_field=fields.UInt32())
+        field.length = 1000
+        obj = list(range(0xFFFFFF00, 0xFFFFFF00 + 100)) * 10
+        data = b"\xff" + struct.pack("<1000I", *obj)
+        value, length = field.deserialize(data, 1)
+        self.assertEqual(value, obj)
+        self.assertEqual(length, 4000)
+        with self.assertRaises(struct.error):
+            field.deserialize(data, 2)
+
+    def test_deserialize_short_data(self):
+        for count in (2, 1000):
+            field = fields.DynamicList(element_field=fields.UInt32())
+            field.length = count
+            with self.assertRaises(struct.error):
+                field.deserialize(bytes(4 * count - 1))
+
+    def test_deserialize_as_array(self):
+        field = fields.DynamicList(element_field=fields.UInt16(), as_array=True)
+        field.length = 2
+        data = b"\xff\x01\x00\xff\xff\x00"
+        value, length = field.deserialize(data, 1)
+        self.assertIsInstance(value, array.array)
+        self.assertEqual(value.tolist(), [1, 0xFFFF])
+        self.assertEqual(length, 4)
+
+    def test_serialize_array(self):
+        field = fields.DynamicList(element_field=fields.UInt16(), as_array=True)
+        obj = array.array("H", [1, 0xFFFF])
+        data = field.serialize(obj)
+        self.assertEqual(data, b"\x01\x00\xff\xff")
+
+    def test_serialize_non_unsigned_array(self):
+        field = fields.DynamicList(element_field=fields.UInt32(), as_array=True)
+        self.assertEqual(field.serialize(array.array("i", [1])), b"\x01\x00\x00\x00")
+        with self.assertRaises(struct.error):
+            field.serialize(array.array("i", [-1]))
+        with self.assertRaises(struct.error):
+            field.serialize(array.array("f", [1.0]))
+
+    def test_as_array_requires_uint(self):
+        with self.assertRaises(ValueError):
+            fields.DynamicList(element_field=fields.ZString(), as_array=True)
+
+        with self.assertRaises(ValueError):
+            fields.DynamicList(element_field=DoubledUInt8(), as_array=True)
+
+    def test_deserialize_overridden_element(self):
+        field = fields.DynamicList(element_field=DoubledUInt8())
+        field.length = 2
+        value, length = field.deserialize(b"\x04\x06")
+        self.assertEqual(value, [2, 3])
+        self.assertEqual(length, 2)
+
+    def test_deserialize_byte_arrays(self):
+        field = fields.DynamicList(element_field=fields.ByteArray(length=2))
+        field.length = 2
+        data = b"\xffabcd\xff"
+        value, length = field.deserialize(data, 1)
+        self.assertEqual(value, [b"ab", b"cd"])
+        self.assertEqual(length, 4)
+
+    def test_deserialize_empty_byte_arrays(self):
+        field = fields.DynamicList(element_field=fields.ByteArray(length=0))
+        for count in (0, 2):
+            field.length = count
+            value, length = field.deserialize(b"abc", 1)
+            self.assertEqual(value, [b""] * count)
+            self.assertEqual(length, 0)
+
+    def test_serialize_uint16(self):
+        field = fields.DynamicList(element_field=fields.UInt16())
+        obj = [1, 2, 0xFFFF]
+        data = field.serialize(obj)
+        self.assertEqual(data, b"\x01\x00\x02\x00\xff\xff")
+
+    def test_serialize_generator(self):
+        field = fields.DynamicList(element_field=fields.UInt8())
+        data = field.serialize(value for value in (1, 2, 3))
+        self.assertEqual(data, b"\x01\x02\x03")
+
+    def test_serialize_overridden_element(self):
+        field = fields.DynamicList(element_field=DoubledUInt8())
+        data = field.serialize([2, 3])
+        self.assertEqual(data, b"\x04\x06")
+
+    def test_serialize_strings(self):
+        field = fields.DynamicList(element_field=fields.ZString())
+        obj = ["a", "bc"]
+        data = field.serialize(obj)
+        self.assertEqual(data, b"a\0bc\0")
+
 
 class TestEncodedLength(unittest.TestCase):
     def test_deserialize(self):
@@ -134,6 +306,26 @@ class TestEncodedLength(unittest.TestCase):
         data = field.serialize(obj)
         self.assertEqual(data, b"\x05hello")
 
+    def test_deserialize_bytes(self):
+        field = fields.EncodedLength(length_field=fields.UInt16(), element_field=fields.ByteArray(length=0))
+        data = b"\xff\x03\x00abcd"
+        value, length = field.deserialize(data, 1)
+        self.assertEqual(value, b"abc")
+        self.assertEqual(length, 5)
+
+    def test_serialize_bytes(self):
+        field = fields.EncodedLength(length_field=fields.UInt16(), element_field=fields.ByteArray(length=0))
+        obj = b"abc"
+        data = field.serialize(obj)
+        self.assertEqual(data, b"\x03\x00abc")
+
+    def test_overridden_length_field(self):
+        field = fields.EncodedLength(length_field=DoubledUInt8(), element_field=fields.DynamicString())
+        self.assertEqual(field.serialize("ab"), b"\x04ab")
+        value, length = field.deserialize(b"\x04abc")
+        self.assertEqual(value, "ab")
+        self.assertEqual(length, 3)
+
     def test_deserialize_with_list(self):
         field = fields.EncodedLength(
             length_field=fields.UInt8(), element_field=fields.DynamicList(element_field=fields.UInt8())
@@ -166,6 +358,37 @@ class TestNestedSerializer(unittest.TestCase):
         data = field.serialize(obj)
         self.assertEqual(data, b"\x01\x02")
 
+    def test_deserialize_predicate_offset(self):
+        seen = []
+
+        def predicate(serializer, name, field, attrs, data, offset):
+            seen.append((len(data), offset))
+            return data[offset] != 0
+
+        class InnerSerializer(Serializer):
+            a = fields.UInt8()
+            b = fields.UInt8(deserialize_predicate=predicate)
+
+        class TestSerializer(Serializer):
+            header = fields.ZString()
+            inner = fields.NestedSerializer(serializer=InnerSerializer)
+
+        value, length = TestSerializer.deserialize(b"ab\0\x01\x02")
+        self.assertEqual(value, {"header": "ab", "inner": {"a": 1, "b": 2}})
+        self.assertEqual(length, 5)
+        self.assertEqual(seen, [(5, 4)])
+
+    def test_serializer_class(self):
+        class TestSerializer(Serializer):
+            a = fields.UInt8()
+            name = fields.ZString()
+
+        field = fields.NestedSerializer(serializer=TestSerializer)
+        value, length = field.deserialize(b"\x01a\0")
+        self.assertEqual(value, {"a": 1, "name": "a"})
+        self.assertEqual(length, 3)
+        self.assertEqual(field.serialize(value), b"\x01a\0")
+
 
 class TestValidation(unittest.TestCase):
     def test_validator(self):
@@ -195,8 +418,32 @@ class TestReverseFixedString(unittest.TestCase):
         data = field.serialize(obj)
         self.assertEqual(data, b"olleh")
 
+    def test_serialize_pads_and_truncates(self):
+        field = fields.ReverseFixedString(length=4)
+        self.assertEqual(field.serialize("ab"), b"ba\0\0")
+        self.assertEqual(field.serialize("abcdef"), b"fedc")
+
+    def test_non_ascii(self):
+        field = fields.ReverseFixedString(length=4)
+        value, length = field.deserialize(b"reb\x81 world")
+        self.assertEqual(value, "\u00fcber")
+        self.assertEqual(length, 4)
+        self.assertEqual(field.serialize(value), b"reb\x81")
+
 
 class TestDynamicString(unittest.TestCase):
+    def test_copy(self):
+        field = copy.copy(fields.DynamicString())
+        field.length = 3
+
+        class TestSerializer(Serializer):
+            name = field
+            a = fields.ZString()
+
+        value, length = TestSerializer.deserialize(b"abcd\0")
+        self.assertEqual(value, {"name": "abc", "a": "d"})
+        self.assertEqual(length, 5)
+
     def test_deserialize(self):
         field = fields.DynamicString()
         field.length = 5
@@ -210,3 +457,225 @@ class TestDynamicString(unittest.TestCase):
         obj = "hello"
         data = field.serialize(obj)
         self.assertEqual(data, b"hello")
+
+
+class TestSerializer(unittest.TestCase):
+    class TestSerializer(Serializer):
+        magic = fields.ByteArray(length=2)
+        count = fields.UInt16()
+        name = fields.ZString()
+        values = fields.EncodedLength(
+            length_field=fields.UInt8(), element_field=fields.DynamicList(element_field=fields.UInt8())
+        )
+
+    def test_deserialize(self):
+        data = b"MG\x02\x00abc\0\x02\x01\x02"
+        value, length = self.TestSerializer().deserialize(data)
+        self.assertEqual(value, {"magic": b"MG", "count": 2, "name": "abc", "values": [1, 2]})
+        self.assertEqual(length, len(data))
+
+    def test_deserialize_offset(self):
+        data = b"\xff\xffMG\x02\x00abc\0\x02\x01\x02\xff"
+        value, length = self.TestSerializer().deserialize(data, 2)
+        self.assertEqual(value, {"magic": b"MG", "count": 2, "name": "abc", "values": [1, 2]})
+        self.assertEqual(length, 11)
+
+    def test_serialize(self):
+        obj = {"magic": b"MG", "count": 2, "name": "abc", "values": [1, 2]}
+        data = self.TestSerializer().serialize(obj)
+        self.assertEqual(data, b"MG\x02\x00abc\0\x02\x01\x02")
+
+    def test_deserialize_validates_fixed_fields(self):
+        class TestSerializer(Serializer):
+            magic = fields.ByteArray(length=3, validator=fields.file_magic_validator(b"MAG"))
+            a = fields.UInt8()
+
+        value, length = TestSerializer().deserialize(b"MAG\x01")
+        self.assertEqual(value, {"magic": b"MAG", "a": 1})
+        self.assertEqual(length, 4)
+        with self.assertRaises(ValidationError):
+            TestSerializer().deserialize(b"BAD\x01")
+
+    def test_overridden_fixed_field(self):
+        class TestSerializer(Serializer):
+            a = DoubledUInt8()
+            b = fields.UInt8()
+
+        self.assertEqual(TestSerializer.serialize({"a": 2, "b": 1}), b"\x04\x01")
+        value, length = TestSerializer.deserialize(b"\x04\x01")
+        self.assertEqual(value, {"a": 2, "b": 1})
+        self.assertEqual(length, 2)
+
+    def test_overridden_validate(self):
+        class NonZeroUInt8(fields.UInt8):
+            def validate(self, value):
+                if value == 0:
+                    raise ValidationError
+
+        class TestSerializer(Serializer):
+            a = NonZeroUInt8()
+            name = fields.ZString()
+
+        self.assertEqual(TestSerializer.deserialize(b"\x01\0"), ({"a": 1, "name": ""}, 2))
+        with self.assertRaises(ValidationError):
+            TestSerializer.deserialize(b"\x00\0")
+
+    def test_overridden_validate_in_run(self):
+        class NonZeroUInt8(fields.UInt8):
+            def validate(self, value):
+                if value == 0:
+                    raise ValidationError
+
+        class TestSerializer(Serializer):
+            a = fields.UInt8()
+            b = NonZeroUInt8()
+
+        self.assertEqual(TestSerializer.deserialize(b"\x00\x01"), ({"a": 0, "b": 1}, 2))
+        with self.assertRaises(ValidationError):
+            TestSerializer.deserialize(b"\x01\x00")
+        with self.assertRaises(ValidationError):
+            TestSerializer.deserialize_many(b"\x00\x01\x01\x00", 2)
+
+    def test_deserialize_predicate(self):
+        class TestSerializer(Serializer):
+            flag = fields.UInt8()
+            a = fields.UInt8(deserialize_predicate=lambda s, name, field, attrs, data, offset: attrs["flag"])
+            b = fields.UInt8()
+
+        value, length = TestSerializer().deserialize(b"\x01\x02\x03")
+        self.assertEqual(value, {"flag": 1, "a": 2, "b": 3})
+        self.assertEqual(length, 3)
+        value, length = TestSerializer().deserialize(b"\x00\x03")
+        self.assertEqual(value, {"flag": 0, "b": 3})
+        self.assertEqual(length, 2)
+
+    def test_serialize_fixed_fields(self):
+        class TestSerializer(Serializer):
+            magic = fields.ByteArray(length=3)
+            a = fields.UInt8()
+            b = fields.UInt32()
+
+        data = TestSerializer().serialize({"magic": b"MAG", "a": 1, "b": 2})
+        self.assertEqual(data, b"MAG\x01\x02\x00\x00\x00")
+
+    def test_serialize_predicate(self):
+        class TestSerializer(Serializer):
+            flag = fields.UInt8()
+            a = fields.UInt8(serialize_predicate=lambda s, name, field, attrs, data: data != b"\x00")
+            b = fields.UInt8()
+
+        data = TestSerializer().serialize({"flag": 1, "a": 2, "b": 3})
+        self.assertEqual(data, b"\x01\x02\x03")
+        data = TestSerializer().serialize({"flag": 0, "a": 2, "b": 3})
+        self.assertEqual(data, b"\x00\x03")
+
+    def test_fixed_strings(self):
+        class TestSerializer(Serializer):
+            a = fields.UInt8()
+            name = fields.FixedString(length=5)
+            reverse = fields.ReverseFixedString(length=4)
+
+        data = b"\x01hello\x81ber"
+        value, length = TestSerializer().deserialize(data)
+        self.assertEqual(value, {"a": 1, "name": "hello", "reverse": "rebü"})
+        self.assertEqual(length, 10)
+        self.assertEqual(TestSerializer().serialize(value), data)
+
+    def test_serialize_into(self):
+        obj = {"magic": b"MG", "count": 2, "name": "abc", "values": [1, 2]}
+        buf = bytearray(b"\xff")
+        pos = self.TestSerializer().serialize_into(buf, obj, 1)
+        pos = self.TestSerializer().serialize_into(buf, obj, pos)
+        self.assertEqual(pos, 23)
+        self.assertEqual(buf, b"\xff" + b"MG\x02\x00abc\0\x02\x01\x02" * 2)
+
+    def test_serialize_into_fixed_fields(self):
+        class TestSerializer(Serializer):
+            a = fields.UInt8()
+            b = fields.UInt16()
+
+        buf = bytearray(b"\xff" * 4)
+        pos = TestSerializer().serialize_into(buf, {"a": 1, "b": 2})
+        pos = TestSerializer().serialize_into(buf, {"a": 3, "b": 4}, pos)
+        self.assertEqual(pos, 6)
+        self.assertEqual(buf, b"\x01\x02\x00\x03\x04\x00")
+
+    def test_serialize_into_past_end(self):
+        class TestSerializer(Serializer):
+            a = fields.UInt8()
+            b = fields.UInt8()
+
+        obj = {"magic": b"MG", "count": 2, "name": "abc", "values": [1, 2]}
+        for serializer, attrs in ((self.TestSerializer, obj), (TestSerializer, {"a": 1, "b": 2})):
+            buf = bytearray(b"\xff")
+            with self.assertRaises(ValueError):
+                serializer.serialize_into(buf, attrs, 5)
+            self.assertEqual(buf, b"\xff")
+        with self.assertRaises(ValueError):
+            fields.UInt8().serialize_into(bytearray(), 1, 1)
+
+    def test_serialize_into_nested(self):
+        class InnerSerializer(Serializer):
+            a = fields.UInt8()
+            b = fields.UInt8()
+
+        class TestSerializer(Serializer):
+            inner = fields.NestedSerializer(serializer=InnerSerializer())
+            name = fields.ZString()
+
+        buf = bytearray()
+        pos = TestSerializer().serialize_into(buf, {"inner": {"a": 1, "b": 2}, "name": "x"})
+        self.assertEqual(pos, 4)
+        self.assertEqual(buf, b"\x01\x02x\0")
+
+    def test_many(self):
+        records = [
+            {"magic": b"MG", "count": 2, "name": "abc", "values": [1, 2]},
+            {"magic": b"XY", "count": 0, "name": "", "values": []},
+        ]
+        data = self.TestSerializer().serialize_many(records)
+        self.assertEqual(data, b"MG\x02\x00abc\0\x02\x01\x02XY\x00\x00\0\x00")
+        value, length = self.TestSerializer().deserialize_many(b"\xff" + data, 2, 1)
+        self.assertEqual(value, records)
+        self.assertEqual(length, len(data))
+
+    def test_many_fixed_fields(self):
+        class TestSerializer(Serializer):
+            magic = fields.ByteArray(length=3, validator=fields.file_magic_validator(b"MAG"))
+            a = fields.UInt16()
+            name = fields.FixedString(length=2)
+
+        records = [{"magic": b"MAG", "a": 1, "name": "ab"}, {"magic": b"MAG", "a": 2, "name": "cd"}]
+        data = TestSerializer().serialize_many(records)
+        self.assertEqual(data, b"MAG\x01\x00abMAG\x02\x00cd")
+        value, length = TestSerializer().deserialize_many(b"\xff" + data + b"\xff", 2, 1)
+        self.assertEqual(value, records)
+        self.assertEqual(length, 14)
+        with self.assertRaises(struct.error):
+            TestSerializer().deserialize_many(data, 3)
+        with self.assertRaises(ValidationError):
+            TestSerializer().deserialize_many(b"BAD\x01\x00ab", 1)
+
+    def test_many_empty_fixed_fields(self):
+        class TestSerializer(Serializer):
+            a = fields.ByteArray(length=0)
+            b = fields.ByteArray(length=0)
+
+        value, length = TestSerializer().deserialize_many(b"\xff", 3)
+        self.assertEqual(value, [{"a": b"", "b": b""}] * 3)
+        self.assertEqual(length, 0)
+
+
+class TestSlots(unittest.TestCase):
+    def test_fields_have_no_dict(self):
+        for field in (
+            fields.ByteArray(length=4),
+            fields.UInt32(),
+            fields.ZString(),
+            fields.DynamicString(),
+            fields.ReverseFixedString(length=4),
+            fields.DynamicList(element_field=fields.UInt8()),
+            fields.EncodedLength(length_field=fields.UInt8(), element_field=fields.DynamicString()),
+            fields.NestedSerializer(serializer=Serializer()),
+        ):
+            self.assertFalse(hasattr(field, "__dict__"), type(field).__name__)